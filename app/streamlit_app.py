@@ -1,34 +1,61 @@
-﻿import os
+﻿import hashlib
+import io
+import math
+import os
+import time
+from functools import partial
+from pathlib import Path
 from urllib.parse import quote_plus
 
 import pandas as pd
 import streamlit as st
 from sqlalchemy import create_engine, text
 
+# Query results are cached in memory (st.cache_data) and on disk as Feather files,
+# so a restarted app can serve the last results without a Postgres round-trip.
+# The disk files are only read on the first load after the process starts; after that,
+# a TTL expiry or "Clear cache" always refetches from Postgres.
+CACHE_TTL = 300
+CACHE_DIR = Path.home() / ".cache" / "lakehouse_lite"
 
-def _get_secret(key: str, default: str | None = None) -> str | None:
-    # Streamlit Cloud: st.secrets
+# Rows fetched per page of the raw table, so memory stays bounded as the table grows
+RAW_PAGE_SIZE = 2000
+
+
+def _load_secrets() -> dict:
+    # Streamlit Cloud: st.secrets. Locally there is usually no secrets.toml; check for it
+    # first, because reading st.secrets without one puts an error on the page.
     try:
-        if hasattr(st, "secrets") and key in st.secrets:
-            return str(st.secrets[key])
+        if st.secrets.load_if_toml_exists():
+            return dict(st.secrets)
     except Exception:
         pass
+    return {}
+
+
+def _get_secret(secrets: dict, key: str, default: str | None = None) -> str | None:
+    if key in secrets:
+        return str(secrets[key])
     # Local: env vars
     return os.getenv(key, default)
 
 
 def get_db_config() -> dict:
+    # One snapshot of st.secrets per config build, then plain dict lookups
+    secrets = _load_secrets()
     return {
-        "DB_HOST": _get_secret("DB_HOST", ""),
-        "DB_PORT": _get_secret("DB_PORT", "5432"),
-        "DB_NAME": _get_secret("DB_NAME", ""),
-        "DB_USER": _get_secret("DB_USER", ""),
-        "DB_PASSWORD": _get_secret("DB_PASSWORD", ""),
-        "DB_SSLMODE": _get_secret("DB_SSLMODE", "require"),
+        "DB_HOST": _get_secret(secrets, "DB_HOST", ""),
+        "DB_PORT": _get_secret(secrets, "DB_PORT", "5432"),
+        "DB_NAME": _get_secret(secrets, "DB_NAME", ""),
+        "DB_USER": _get_secret(secrets, "DB_USER", ""),
+        "DB_PASSWORD": _get_secret(secrets, "DB_PASSWORD", ""),
+        "DB_SSLMODE": _get_secret(secrets, "DB_SSLMODE", "require"),
     }
 
 
-def make_engine():
+@st.cache_resource(show_spinner=False)
+def _db_url() -> str:
+    # Built once per process; st.cache_resource survives reruns, unlike a module-level cache
     cfg = get_db_config()
     user = cfg["DB_USER"]
     pwd = quote_plus(cfg["DB_PASSWORD"] or "")
@@ -36,79 +63,100 @@ def make_engine():
     port = cfg["DB_PORT"] or "5432"
     db = cfg["DB_NAME"]
     ssl = cfg["DB_SSLMODE"] or "require"
-    url = f"postgresql+psycopg2://{user}:{pwd}@{host}:{port}/{db}?sslmode={ssl}"
-    return create_engine(url, pool_pre_ping=True)
-
-
-def render_table_html(df: pd.DataFrame, height_px: int = 520):
-    # Convert to safe strings to avoid any Arrow/typing issues
-    safe = df.copy()
-    for c in safe.columns:
-        if pd.api.types.is_datetime64_any_dtype(safe[c]):
-            safe[c] = safe[c].astype(str)
-        elif pd.api.types.is_numeric_dtype(safe[c]):
-            # keep numeric as-is
-            pass
-        else:
-            safe[c] = safe[c].fillna("").astype(str)
+    return f"postgresql+psycopg2://{user}:{pwd}@{host}:{port}/{db}?sslmode={ssl}"
 
-    html = safe.to_html(index=False, escape=True)
 
-    # Scrollable container
-    st.markdown(
-        f"""
-        <div style="height:{height_px}px; overflow:auto; border:1px solid #e6e6e6; border-radius:8px; padding:8px;">
-            {html}
-        </div>
-        """,
-        unsafe_allow_html=True,
+@st.cache_resource(show_spinner=False)
+def make_engine():
+    # One engine (and connection pool) per process, shared by every session and rerun
+    return create_engine(
+        _db_url(),
+        pool_pre_ping=True,
+        pool_size=2,
+        max_overflow=3,
+        pool_recycle=1800,
+        connect_args={"keepalives": 1, "keepalives_idle": 30},
     )
 
 
-@st.cache_data(ttl=300)
-def load_metrics():
-    engine = make_engine()
-    q = """
-    SELECT
-      COUNT(*)::int AS total_groups,
-      SUM(penguin_count)::int AS total_penguins,
-      COUNT(DISTINCT species)::int AS species_count
-    FROM analytics.mart_penguin_summary
-    """
-    with engine.connect() as conn:
-        df = pd.read_sql(text(q), conn)
-    return df.iloc[0].to_dict()
+@st.cache_resource(show_spinner=False)
+def _process_state() -> dict:
+    # Lives as long as the server process (module globals are reset on every rerun)
+    return {"cold_start": True}
 
 
-@st.cache_data(ttl=300)
-def load_summary():
-    engine = make_engine()
-    q = """
-    SELECT
-      species,
-      sex,
-      penguin_count,
-      avg_body_mass_g,
-      avg_flipper_length_mm
-    FROM analytics.mart_penguin_summary
-    ORDER BY species, sex
-    """
-    with engine.connect() as conn:
-        df = pd.read_sql(text(q), conn)
-
-    # Basic cleanup
-    df = df.copy()
-    df["species"] = df["species"].astype(str).str.strip()
-    df["sex"] = df["sex"].fillna("unknown").astype(str).str.strip()
-    df["penguin_count"] = pd.to_numeric(df["penguin_count"], errors="coerce").fillna(0).astype(int)
-    df["avg_body_mass_g"] = pd.to_numeric(df["avg_body_mass_g"], errors="coerce")
-    df["avg_flipper_length_mm"] = pd.to_numeric(df["avg_flipper_length_mm"], errors="coerce")
-    return df
-
-
-@st.cache_data(ttl=300)
-def load_raw_all():
-    engine = make_engine()
+def _read_sql(conn, q: str, params: dict | None = None, dtype: dict | None = None) -> pd.DataFrame:
+    return pd.read_sql(text(q), conn, params=params, dtype=dtype)
+
+
+def _read_sql_copy(
+    conn, q: str, params: dict | None = None, dtype: dict | None = None, na_values=None
+) -> pd.DataFrame:
+    # Let Postgres stream the result as CSV and build the columns with pandas' C parser,
+    # instead of fetching every row as a Python tuple first.
+    buf = io.StringIO()
+    with conn.connection.cursor() as cur:
+        stmt = cur.mogrify(q, params).decode()
+        cur.copy_expert(f"COPY ({stmt}) TO STDOUT WITH CSV HEADER", buf)
+    buf.seek(0)
+    na_values = [""] if na_values is None else na_values
+    return pd.read_csv(buf, dtype=dtype, keep_default_na=False, na_values=na_values)
+
+
+def _cache_path(db_url: str, q: str, params: dict | None) -> Path:
+    # Keyed on the database too, so pointing the app at another DB never serves its old rows
+    key = hashlib.sha1((db_url + q + str(params)).encode("utf-8")).hexdigest()
+    return CACHE_DIR / f"{key}.feather"
+
+
+def _write_cache(path: Path, df: pd.DataFrame) -> None:
+    # An empty result usually means the tables aren't loaded yet; don't let it outlive a restart
+    if df.empty:
+        return
+    # Write to a temp file first so other sessions never read a half-written cache file
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.stem}.{os.getpid()}.tmp")
+        df.to_feather(tmp, compression="zstd")
+        tmp.replace(path)
+    except OSError:
+        # Read-only filesystem: keep working with the in-memory cache only
+        pass
+
+
+def _cached_queries(queries: dict[str, tuple]) -> dict:
+    # queries maps a name to (sql, params, reader).
+    # On a cold start serve what we can from disk, then run the misses back-to-back
+    # on one pooled connection. Every later load goes straight to Postgres.
+    state = _process_state()
+    use_disk = state["cold_start"]
+    state["cold_start"] = False
+
+    db_url = _db_url()
+    results = {}
+    missing = {}
+    for name, (q, params, reader) in queries.items():
+        path = _cache_path(db_url, q, params)
+        if use_disk and path.exists() and time.time() - path.stat().st_mtime < CACHE_TTL:
+            results[name] = pd.read_feather(path)
+        else:
+            missing[name] = (q, params, reader)
+
+    if missing:
+        engine = make_engine()
+        with engine.connect() as conn:
+            for name, (q, params, reader) in missing.items():
+                results[name] = reader(conn, q, params)
+                _write_cache(_cache_path(db_url, q, params), results[name])
+    return results
+
+
+def _cached_query(q: str, params: dict | None = None, reader=_read_sql) -> pd.DataFrame:
+    return _cached_queries({"result": (q, params, reader)})["result"]
+
+
+def _raw_page_query(page: int) -> tuple:
+    # psycopg2-style placeholders: this query goes through COPY, not SQLAlchemy text()
     q = """
     SELECT
       species,
@@ -119,22 +167,80 @@ def load_raw_all():
       body_mass_g,
       sex
     FROM raw.penguins
-    ORDER BY species, island, sex NULLS LAST
+    ORDER BY species, island, sex NULLS LAST, bill_length_mm, bill_depth_mm, flipper_length_mm, body_mass_g
+    LIMIT %(limit)s OFFSET %(offset)s
     """
-    with engine.connect() as conn:
-        df = pd.read_sql(text(q), conn)
+    params = {"limit": RAW_PAGE_SIZE, "offset": int(page) * RAW_PAGE_SIZE}
+
+    # Types are set at read time, so the CSV parser builds the final columns directly:
+    # - measurements are double precision in Postgres; float32 is plenty for display
+    # - low-cardinality text is stored as category codes instead of one string per row
+    # Only the measurements treat an empty field as NULL; missing text stays "".
+    num_cols = ["bill_length_mm", "bill_depth_mm", "flipper_length_mm", "body_mass_g"]
+    reader = partial(
+        _read_sql_copy,
+        dtype={"species": "category", "island": "category", "sex": "category", **{c: "float32" for c in num_cols}},
+        na_values={c: [""] for c in num_cols},
+    )
+    return q, params, reader
 
-    # Make sure types are simple
-    df = df.copy()
-    for c in ["bill_length_mm", "bill_depth_mm", "flipper_length_mm", "body_mass_g"]:
-        if c in df.columns:
-            df[c] = pd.to_numeric(df[c], errors="coerce")
 
-    for c in ["species", "island", "sex"]:
-        if c in df.columns:
-            df[c] = df[c].fillna("").astype(str)
+@st.cache_data(ttl=CACHE_TTL)
+def load_dashboard():
+    # Every query the page needs, fetched together so a refresh costs one connection checkout
+    queries = {
+        # One precomputed row, refreshed by dbt runs (see mart_penguin_kpis.sql)
+        "metrics": """
+        SELECT
+          total_groups,
+          total_penguins,
+          species_count
+        FROM analytics.mart_penguin_kpis
+        """,
+        "summary": """
+        SELECT
+          trim(species) AS species,
+          trim(coalesce(sex, 'unknown')) AS sex,
+          penguin_count,
+          avg_body_mass_g::double precision AS avg_body_mass_g,
+          avg_flipper_length_mm::double precision AS avg_flipper_length_mm
+        FROM analytics.mart_penguin_summary
+        ORDER BY species, sex
+        """,
+        "raw_count": "SELECT COUNT(*)::int AS row_count FROM raw.penguins",
+    }
+    batch = {name: (q, None, _read_sql) for name, q in queries.items()}
+    # species/sex are trimmed and null-filled in SQL, so the summary only needs its dtypes set
+    batch["summary"] = (
+        queries["summary"],
+        None,
+        partial(_read_sql, dtype={"species": "category", "sex": "category", "penguin_count": "int32"}),
+    )
+    # The first raw page is shown on every cold render, so it rides on the same connection
+    batch["raw_first_page"] = _raw_page_query(0)
+    dfs = _cached_queries(batch)
+    return {
+        "metrics": dfs["metrics"].iloc[0].to_dict(),
+        "summary": dfs["summary"],
+        "raw_count": int(dfs["raw_count"].iloc[0]["row_count"]),
+        "raw_first_page": dfs["raw_first_page"],
+    }
+
+
+@st.cache_data(ttl=CACHE_TTL, max_entries=8)
+def load_raw_page(page: int):
+    q, params, reader = _raw_page_query(page)
+    return _cached_query(q, params, reader)
 
-    return df
+
+@st.fragment
+def raw_penguins_panel(raw_rows: int, first_page: pd.DataFrame):
+    # Changing the page only reruns this block, not the KPIs and summary above it
+    raw_pages = max(1, math.ceil(raw_rows / RAW_PAGE_SIZE))
+    page = st.number_input("Page", min_value=1, max_value=raw_pages, value=1, step=1)
+    raw_df = first_page if int(page) == 1 else load_raw_page(int(page) - 1)
+    st.caption(f"Rows: {raw_rows} (page {int(page)} of {raw_pages})")
+    st.dataframe(raw_df, use_container_width=True, height=650)
 
 
 st.set_page_config(page_title="Lakehouse Lite", layout="wide")
@@ -142,7 +248,9 @@ st.set_page_config(page_title="Lakehouse Lite", layout="wide")
 st.title("Lakehouse Lite")
 st.caption("Python ingestion → Postgres raw layer → dbt transformations → Streamlit dashboard")
 
-m = load_metrics()
+data = load_dashboard()
+
+m = data["metrics"]
 c1, c2, c3 = st.columns(3)
 c1.metric("Total groups", int(m["total_groups"]))
 c2.metric("Total penguins", int(m["total_penguins"]))
@@ -151,12 +259,10 @@ c3.metric("Species count", int(m["species_count"]))
 st.markdown("---")
 
 st.subheader("Penguin summary by species and sex")
-summary = load_summary()
-render_table_html(summary, height_px=320)
+summary = data["summary"]
+st.dataframe(summary, use_container_width=True, height=320)
 
 st.markdown("---")
 
-st.subheader("Raw penguins (all rows)")
-raw_df = load_raw_all()
-st.caption(f"Rows: {len(raw_df)}")
-render_table_html(raw_df, height_px=650)
+st.subheader("Raw penguins")
+raw_penguins_panel(data["raw_count"], data["raw_first_page"])
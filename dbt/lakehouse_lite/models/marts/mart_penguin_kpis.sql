@@ -0,0 +1,7 @@
+{{ config(materialized="table") }}
+
+select
+  count(*)::int as total_groups,
+  sum(penguin_count)::int as total_penguins,
+  count(distinct species)::int as species_count
+from {{ ref("mart_penguin_summary") }}
@@ -1,5 +1,6 @@
-﻿import re
-from pathlib import Path
+﻿from pathlib import Path
+
+from neon_url import parse_url
 
 s = Path(".env.neon").read_text(encoding="utf-8").strip()
 
@@ -7,11 +8,11 @@ s = Path(".env.neon").read_text(encoding="utf-8").strip()
 if (s.startswith('"') and s.endswith('"')) or (s.startswith("'") and s.endswith("'")):
     s = s[1:-1].strip()
 
-m = re.search(r"postgres(?:ql)?://([^:]+):([^@]+)@([^:/]+)(?::(\d+))?/([^?\s]+)", s)
-if not m:
+parsed = parse_url(s)
+if not parsed:
     raise SystemExit("Could not parse the connection string in .env.neon")
 
-user, pwd, host, port, db = m.group(1), m.group(2), m.group(3), (m.group(4) or "5432"), m.group(5)
+user, pwd, host, port, db = parsed
 ssl = "require" if "sslmode=require" in s else "require"  # neon typically needs require
 
 Path(".env").write_text(
@@ -0,0 +1,26 @@
+﻿import re
+from urllib.parse import quote, unquote, urlsplit
+
+# Accept both postgres:// and postgresql://, also when wrapped in text like psql 'postgresql://...'
+_URL_RE = re.compile(r"postgres(?:ql)?://\S+")
+
+
+# Returns (user, password, host, port, db), or None if the string doesn't look like a Postgres URL
+def parse_url(s: str):
+    m = _URL_RE.search(s)
+    if not m:
+        return None
+    # Escape "%" and "#" so urlsplit reads the text literally (a "#" in a password
+    # would otherwise start a URL fragment); unquote gives back the original text.
+    url = quote(m.group(0).strip("'\""), safe=":/?@=&[]")
+
+    try:
+        u = urlsplit(url)
+        port = u.port or 5432
+    except ValueError:
+        return None
+    user, password, host = u.username, u.password, u.hostname
+    db = unquote(u.path.lstrip("/"))
+    if not (user and password and host and db):
+        return None
+    return unquote(user), unquote(password), host, str(port), db
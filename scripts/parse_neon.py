@@ -1,5 +1,6 @@
-﻿import re
-from pathlib import Path
+﻿from pathlib import Path
+
+from neon_url import parse_url
 
 p = Path(".env.neon")
 if not p.exists():
@@ -7,12 +8,11 @@ if not p.exists():
 
 s = p.read_text(encoding="utf-8").strip().strip('"').strip("'")
 
-# Accept both postgres:// and postgresql://
-m = re.search(r"postgres(?:ql)?://([^:]+):([^@]+)@([^:/]+)(?::(\d+))?/([^?\s]+)", s)
-if not m:
+parsed = parse_url(s)
+if not parsed:
     raise SystemExit("ERROR: Could not parse connection string. Paste the full Neon connection string into .env.neon")
 
-user, password, host, port, db = m.group(1), m.group(2), m.group(3), m.group(4) or "5432", m.group(5)
+user, password, host, port, db = parsed
 ssl = "require" if "sslmode=require" in s else "disable"
 
 print("FOUND_URL=", True)
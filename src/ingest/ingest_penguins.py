@@ -1,21 +1,44 @@
-﻿import pandas as pd
+﻿import io
+import urllib.request
+
+import pandas as pd
 from sqlalchemy import text
 from pathlib import Path
 
 from db import get_engine
 
 PENGUINS_CSV_URL = "https://raw.githubusercontent.com/mwaskom/seaborn-data/master/penguins.csv"
-LOCAL_CSV_PATH = Path(r"E:\MyProjects\lakehouse-lite\data\raw\penguins.csv")
+LOCAL_CSV_PATH = Path(__file__).resolve().parents[2] / "data" / "raw" / "penguins.csv"
+
+# Low-cardinality text columns, parsed straight to category to keep the frame small
+CSV_DTYPES = {"species": "category", "island": "category", "sex": "category"}
+
+RAW_COLUMNS = [
+    "species",
+    "island",
+    "bill_length_mm",
+    "bill_depth_mm",
+    "flipper_length_mm",
+    "body_mass_g",
+    "sex",
+]
 
 
 def load_penguins() -> pd.DataFrame:
     # Prefer local file if it exists, else download from GitHub
     if LOCAL_CSV_PATH.exists():
         print(f"Loading local dataset: {LOCAL_CSV_PATH}")
-        df = pd.read_csv(LOCAL_CSV_PATH)
+        df = pd.read_csv(LOCAL_CSV_PATH, dtype=CSV_DTYPES)
     else:
         print("Downloading dataset...")
-        df = pd.read_csv(PENGUINS_CSV_URL)
+        with urllib.request.urlopen(PENGUINS_CSV_URL) as resp:
+            raw = resp.read()
+
+        # Keep the downloaded bytes as-is so the next run skips the download
+        LOCAL_CSV_PATH.parent.mkdir(parents=True, exist_ok=True)
+        LOCAL_CSV_PATH.write_bytes(raw)
+        print(f"Saved dataset to: {LOCAL_CSV_PATH}")
+        df = pd.read_csv(io.BytesIO(raw), dtype=CSV_DTYPES)
 
     # basic cleanup
     df.columns = [c.strip().lower().replace(" ", "_") for c in df.columns]
@@ -41,6 +64,16 @@ def ensure_table(conn) -> None:
     )
 
 
+def copy_penguins(conn, df: pd.DataFrame) -> None:
+    # COPY streams every row in one statement instead of one INSERT per row
+    buf = io.StringIO()
+    df[RAW_COLUMNS].to_csv(buf, index=False, header=False)
+    buf.seek(0)
+    cols = ", ".join(RAW_COLUMNS)
+    with conn.connection.cursor() as cur:
+        cur.copy_expert(f"COPY raw.penguins ({cols}) FROM STDIN WITH CSV", buf)
+
+
 def main():
     engine = get_engine()
 
@@ -54,8 +87,8 @@ def main():
         print("Clearing old rows (keeping table)...")
         conn.execute(text("TRUNCATE TABLE raw.penguins;"))
 
-    print(f"Loading {len(df)} rows into raw.penguins ...")
-    df.to_sql("penguins", engine, schema="raw", if_exists="append", index=False)
+        print(f"Loading {len(df)} rows into raw.penguins ...")
+        copy_penguins(conn, df)
 
     print("Done.")
 